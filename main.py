@@ -1,92 +1,228 @@
 import os
-import json
+import re
+import orjson
 import base64
+import binascii
 import asyncio
+import logging
+import uvloop
+import httpx
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from dotenv import load_dotenv
-from pydub import AudioSegment
-import io
+
+# libuv-based loop: roughly halves per-callback overhead on the
+# receive-media/send-media hot loops and the clients' TLS I/O.
+uvloop.install()
 
 from deepgram import (
     DeepgramClient, DeepgramClientOptions, LiveTranscriptionEvents, LiveOptions
 )
-from openai import OpenAI
-from elevenlabs.client import ElevenLabs
-from elevenlabs import stream
+from openai import AsyncOpenAI
+from elevenlabs.client import AsyncElevenLabs
 
 # --- INITIALIZATION ---
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 
 # Initialize clients
-deepgram_client = DeepgramClient(DEEPGRAM_API_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+# keepalive stops Deepgram from closing pooled sockets that are briefly idle
+# between calls.
+deepgram_client = DeepgramClient(DEEPGRAM_API_KEY, DeepgramClientOptions(options={"keepalive": "true"}))
+# One HTTP/2 pool shared by OpenAI and ElevenLabs: long keep-alive means a
+# turn reuses a warm connection instead of paying a TLS handshake.
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=300),
+)
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+elevenlabs_client = AsyncElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=http_client)
 
 app = FastAPI()
 
+# Built once so every turn reuses the same dict; a stable prefix also lets
+# OpenAI's server-side prompt caching kick in.
+SYSTEM_MSG = {"role": "system", "content": "You are a friendly and helpful AI assistant named Leo. Keep your responses very short and conversational."}
+
+# Pre-warmed Deepgram connections: opening one pays TLS handshake plus
+# session setup, which otherwise shows up as first-word transcript delay.
+DG_POOL_SIZE = 2
+dg_pool: asyncio.Queue = asyncio.Queue()
+
+async def open_dg_connection():
+    dg_connection = deepgram_client.listen.asynclive.v("1")
+    await dg_connection.start(LiveOptions(model="nova-2-general", language="en-IN", encoding="mulaw", sample_rate=8000, punctuate=True, interim_results=True))
+    return dg_connection
+
+async def replenish_dg_pool():
+    if dg_pool.qsize() >= DG_POOL_SIZE:
+        return
+    try:
+        dg_pool.put_nowait(await open_dg_connection())
+    except Exception as e:
+        logger.warning("Could not pre-warm Deepgram connection: %s", e)
+
+@app.on_event("startup")
+async def prewarm_deepgram_pool():
+    for _ in range(DG_POOL_SIZE):
+        await replenish_dg_pool()
+
+@app.on_event("startup")
+async def prewarm_http_pool():
+    # A cheap request opens the TLS connection now rather than on the
+    # first caller's first turn.
+    try:
+        await openai_client.models.list()
+    except Exception as e:
+        logger.warning("Could not pre-warm OpenAI connection: %s", e)
+
 # --- THE MAIN CONVERSATIONAL LOGIC ---
 class ConversationManager:
     def __init__(self, websocket: WebSocket, stream_sid: str):
+        self.attach(websocket, stream_sid)
+
+    def attach(self, websocket: WebSocket, stream_sid: str):
+        # A pooled instance must never carry a previous call's turn into a
+        # new one: cancel anything still in flight before rebinding, the
+        # same way detach() does.
+        if getattr(self, "_turn_task", None) and not self._turn_task.done():
+            self._turn_task.cancel()
         self.websocket = websocket
         self.stream_sid = stream_sid
         self.is_speaking = False # To prevent interruption
+        self._turn_task = None # In-flight LLM+TTS turn, cancellable on barge-in
+        # Deepgram can emit the same final repeatedly while the endpointer
+        # settles; remember the last one so we don't re-run OpenAI on it.
+        self._last_final = ""
+        self._last_final_ts = 0.0
+        # Pre-built media envelope so the per-chunk loop only concatenates
+        # bytes instead of allocating a dict + json.dumps 50x/sec.
+        self._media_prefix = (
+            '{"event":"media","streamSid":"%s","media":{"payload":"' % stream_sid
+        ).encode('ascii')
+        self._media_suffix = b'"}}'
+
+    def detach(self):
+        # Kill any in-flight turn before the instance can be pooled: a
+        # stale task resuming after attach() would stream the previous
+        # conversation's audio into the new call.
+        if self._turn_task and not self._turn_task.done():
+            self._turn_task.cancel()
+        self.websocket = None
+        self._turn_task = None
+
+    def is_duplicate_final(self, sentence: str) -> bool:
+        now = asyncio.get_running_loop().time()
+        if sentence == self._last_final and now - self._last_final_ts < 1.5:
+            return True
+        self._last_final = sentence
+        self._last_final_ts = now
+        return False
+
+    def begin_turn(self, task: asyncio.Task):
+        # A newer final transcript supersedes whatever is still in flight.
+        if self._turn_task and not self._turn_task.done():
+            self._turn_task.cancel()
+        self._turn_task = task
+
+    async def interrupt(self):
+        if self._turn_task and not self._turn_task.done():
+            logger.debug("Barge-in detected, cancelling in-flight response.")
+            self._turn_task.cancel()
+            # Tell Twilio to flush audio it has already buffered.
+            clear_message = {"event": "clear", "streamSid": self.stream_sid}
+            await self.websocket.send_text(orjson.dumps(clear_message).decode('ascii'))
 
     async def handle_response(self, text: str):
         if self.is_speaking:
-            print("[DEBUG] AI is already speaking, ignoring new request.")
+            logger.debug("AI is already speaking, ignoring new request.")
             return
         
         self.is_speaking = True
-        print(f"--- STARTING AI RESPONSE (Final Pattern) ---")
-        print(f"1. AI Text: '{text}'")
+        logger.debug("Starting AI response: '%s'", text)
 
         try:
-            print("2. Calling ElevenLabs for 8kHz mu-law audio...")
-            # This returns a BLOCKING generator, which is the source of all our complexity
+            # The async client gives us an async iterator directly, so no
+            # executor threads are involved anywhere on this path.
             audio_stream = elevenlabs_client.text_to_speech.stream(
                 text=text,
                 voice_id="21m00Tcm4TlvDq8ikWAM",
                 model_id="eleven_turbo_v2",
                 output_format="ulaw_8000"
             )
-            print("3. ElevenLabs stream received.")
 
-            # This is the correct, non-blocking pattern to handle a blocking generator in asyncio
-            loop = asyncio.get_running_loop()
-            stream_iterator = iter(audio_stream)
+            # The queue decouples the ElevenLabs fetch from the Twilio
+            # sender, so a slow chunk download never stalls pacing.
+            chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=50)
 
-            # Wrapper function to safely get the next chunk in a separate thread
-            def get_next_chunk():
+            async def producer():
+                # If the ElevenLabs request fails, log it here and still
+                # enqueue the sentinel -- otherwise the consumer blocks on
+                # the queue forever and the turn silently never answers.
+                # Cancellation skips the sentinel; the consumer is gone.
                 try:
-                    return next(stream_iterator)
-                except StopIteration:
-                    return None
+                    async for chunk in audio_stream:
+                        await chunk_queue.put(chunk)
+                except Exception as e:
+                    logger.error("ElevenLabs TTS stream failed: %s", e)
+                await chunk_queue.put(None)
 
-            print("4. Streaming non-blocking, paced chunks to Twilio...")
+            producer_task = asyncio.create_task(producer())
+
+            loop = asyncio.get_running_loop()
+            start_time = loop.time()
+            bytes_sent = 0
             chunk_count = 0
-            while True:
-                # Run the blocking call in the executor
-                chunk = await loop.run_in_executor(None, get_next_chunk)
-                
-                # Stop when the generator is exhausted
-                if chunk is None:
-                    break
-
-                chunk_count += 1
-                media_message = {
-                    "event": "media",
-                    "streamSid": self.stream_sid,
-                    "media": {"payload": base64.b64encode(chunk).decode('utf-8')}
-                }
-                await self.websocket.send_text(json.dumps(media_message))
-                
-                # Pacing the stream is crucial for stability with Twilio
-                await asyncio.sleep(0.02) # Increased sleep slightly for more stability
-            
-            print(f"5. All {chunk_count} chunks sent successfully.")
+            # Coalesce ~80ms of audio per media event; Twilio buffers that
+            # happily and it cuts websocket-frame and JSON envelope overhead
+            # 4-5x versus one event per 20ms chunk.
+            pending = bytearray()
+
+            async def flush_pending():
+                nonlocal bytes_sent
+                # b64encode is just a wrapper that re-wraps b2a_base64's
+                # output; calling it directly saves one allocation per frame.
+                frame = self._media_prefix + binascii.b2a_base64(pending, newline=False) + self._media_suffix
+                await self.websocket.send_text(frame.decode('ascii'))
+
+                # Pacing the stream is crucial for stability with Twilio.
+                # mu-law at 8kHz is one byte per sample, so sleep against the
+                # real audio clock instead of a fixed interval per flush.
+                bytes_sent += len(pending)
+                pending.clear()
+                delay = start_time + bytes_sent / 8000 - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            try:
+                while True:
+                    chunk = await chunk_queue.get()
+                    if chunk is None:
+                        break
+
+                    chunk_count += 1
+                    pending.extend(chunk)
+                    if len(pending) >= 640:
+                        await flush_pending()
+                if pending:
+                    await flush_pending()
+            finally:
+                # Reap the producer on every exit path, not just barge-in:
+                # a hangup raises out of send_text, and an unreaped producer
+                # would block forever on the bounded queue while holding the
+                # ElevenLabs stream open.
+                if not producer_task.done():
+                    producer_task.cancel()
+                try:
+                    await producer_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+            logger.debug("All %d chunks sent successfully.", chunk_count)
 
             # Send the mark message to signal the end of the TTS
             mark_message = {
@@ -94,75 +230,189 @@ class ConversationManager:
                 "streamSid": self.stream_sid,
                 "mark": {"name": "ai_speech_ended"}
             }
-            await self.websocket.send_text(json.dumps(mark_message))
-            print("6. 'Mark' message sent.")
+            await self.websocket.send_text(orjson.dumps(mark_message).decode('ascii'))
 
         except Exception as e:
-            print(f"[ERROR] During AI response generation/streaming: {e}")
+            logger.error("During AI response generation/streaming: %s", e)
 
         finally:
             self.is_speaking = False
-            print("--- AI RESPONSE COMPLETE ---")
+
+# Small free-list of managers: calls churn through these quickly under load,
+# and rebinding is cheaper than reallocating the instance and its envelope.
+_MGR_POOL: list = []
+_MGR_POOL_MAX = 32
+
+def acquire_manager(websocket: WebSocket, stream_sid: str) -> ConversationManager:
+    if _MGR_POOL:
+        manager = _MGR_POOL.pop()
+        manager.attach(websocket, stream_sid)
+        return manager
+    return ConversationManager(websocket, stream_sid)
+
+def release_manager(manager):
+    if manager is None:
+        return
+    # Detach unconditionally -- even a manager the full pool is about to
+    # drop must have its in-flight turn cancelled, or it keeps streaming
+    # against a closed websocket.
+    manager.detach()
+    if len(_MGR_POOL) < _MGR_POOL_MAX:
+        _MGR_POOL.append(manager)
 
 # --- WEBSOCKET ENDPOINT ---
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    print("--- Twilio WebSocket connection accepted ---")
+    logger.info("Twilio WebSocket connection accepted")
     
     stream_sid = None
     conversation_manager = None
-    
+    forwarder_task = None
+    dg_connection = None
+
     try:
-        # Deepgram connection setup
-        dg_connection = deepgram_client.listen.asynclive.v("1")
+        # Deepgram connection setup: take a pre-warmed socket when one is
+        # available, falling back to opening a fresh one.
+        try:
+            dg_connection = dg_pool.get_nowait()
+        except asyncio.QueueEmpty:
+            dg_connection = await open_dg_connection()
 
         async def on_message(self, result, **kwargs):
             sentence = result.channel.alternatives[0].transcript
             if len(sentence) == 0:
                 return
             
-            print(f"User: {sentence}")
-
-            if result.is_final and conversation_manager:
-                print(f"Final transcript received: '{sentence}'.")
-                # Send to OpenAI
-                chat_completion = openai_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": "You are a friendly and helpful AI assistant named Leo. Keep your responses very short and conversational."},
-                        {"role": "user", "content": sentence},
-                    ],
-                    model="gpt-3.5-turbo",
-                )
-                ai_response = chat_completion.choices[0].message.content
-                await conversation_manager.handle_response(ai_response)
+            logger.debug("User: %s", sentence)
+
+            # websocket is None once the manager is detached; Deepgram can
+            # still flush a trailing final during teardown and must not
+            # start a turn on a pooled manager.
+            if conversation_manager is None or conversation_manager.websocket is None:
+                return
+
+            if not result.is_final:
+                # The user is talking over the AI: cancel the in-flight
+                # response instead of ignoring their audio.
+                await conversation_manager.interrupt()
+                return
+
+            if conversation_manager.is_duplicate_final(sentence):
+                logger.debug("Duplicate final transcript ignored: '%s'", sentence)
+                return
+
+            logger.info("Final transcript received: '%s'", sentence)
+
+            async def run_turn():
+                try:
+                    # Stream the completion and hand each finished sentence to
+                    # TTS immediately, so speech starts after the first sentence
+                    # instead of after the whole answer.
+                    completion_stream = await openai_client.chat.completions.create(
+                        messages=[
+                            SYSTEM_MSG,
+                            {"role": "user", "content": sentence},
+                        ],
+                        model="gpt-3.5-turbo",
+                        stream=True,
+                    )
+
+                    buf = ""
+                    async for chat_event in completion_stream:
+                        if not chat_event.choices:
+                            continue
+                        delta = chat_event.choices[0].delta.content
+                        if not delta:
+                            continue
+                        buf += delta
+                        if re.search(r'[.!?]\s*$', buf):
+                            await conversation_manager.handle_response(buf.strip())
+                            buf = ""
+                    if buf.strip():
+                        await conversation_manager.handle_response(buf.strip())
+                except asyncio.CancelledError:
+                    logger.debug("Response turn cancelled by barge-in.")
+
+            conversation_manager.begin_turn(asyncio.create_task(run_turn()))
 
         dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
-        await dg_connection.start(LiveOptions(model="nova-2-general", language="en-IN", encoding="mulaw", sample_rate=8000, punctuate=True, interim_results=True))
+
+        # Decode + forward inbound audio off the receive loop so base64 work
+        # never blocks reading the next Twilio frame. Bounded so a stalled
+        # Deepgram socket can't buffer audio without limit.
+        inbound_q: asyncio.Queue = asyncio.Queue(maxsize=200)
+
+        async def forwarder():
+            while True:
+                payload = await inbound_q.get()
+                try:
+                    await dg_connection.send(base64.b64decode(payload))
+                except Exception as e:
+                    # A dead Deepgram socket means no more transcripts; end
+                    # the call rather than leave the caller talking to air.
+                    logger.error("Deepgram send failed, ending call: %s", e)
+                    try:
+                        await websocket.close()
+                    except Exception:
+                        pass
+                    return
+
+        forwarder_task = asyncio.create_task(forwarder())
 
         # Main loop to process messages from Twilio
         while True:
             message = await websocket.receive_text()
-            data = json.loads(message)
+            data = orjson.loads(message)
             event = data.get('event')
 
             if event == 'start':
                 stream_sid = data['start']['streamSid']
-                conversation_manager = ConversationManager(websocket, stream_sid)
-                print(f"Twilio stream started with SID: {stream_sid}")
+                conversation_manager = acquire_manager(websocket, stream_sid)
+                logger.info("Twilio stream started with SID: %s", stream_sid)
 
             elif event == 'media':
-                if not conversation_manager.is_speaking:
-                  await dg_connection.send(base64.b64decode(data['media']['payload']))
-                # await dg_connection.send(base64.b64decode(data['media']['payload']))
+                # Audio keeps flowing to Deepgram even while the AI speaks,
+                # so barge-in can be detected from interim transcripts.
+                try:
+                    inbound_q.put_nowait(data['media']['payload'])
+                except asyncio.QueueFull:
+                    logger.warning("Inbound audio queue full, dropping frame.")
 
             elif event == 'stop':
-                print("--- Twilio 'stop' event received. Call has ended. ---")
+                logger.info("Twilio 'stop' event received. Call has ended.")
                 break
     
     except WebSocketDisconnect:
-        print("--- Twilio WebSocket disconnected ---")
+        logger.info("Twilio WebSocket disconnected")
     
     finally:
-        print("--- Cleaning up connection... ---")
-        # Clean shutdown logic can be added here if needed
\ No newline at end of file
+        logger.info("Cleaning up connection...")
+        if forwarder_task is not None:
+            forwarder_task.cancel()
+        if dg_connection is not None:
+            try:
+                await dg_connection.finish()
+            except Exception as e:
+                logger.warning("Error closing Deepgram connection: %s", e)
+            # Handlers are bound to this call, so retire the socket and
+            # pre-warm a replacement off the call path.
+            asyncio.create_task(replenish_dg_pool())
+        # Release only after the Deepgram socket is closed: finish() often
+        # flushes one last final transcript, and releasing first would let
+        # on_message begin a turn on an already-pooled manager.
+        release_manager(conversation_manager)
+if __name__ == "__main__":
+    import uvicorn
+
+    # Keep websocket buffering shallow: media frames are small and latency
+    # matters more than throughput here.
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        ws="websockets",
+        ws_max_size=65536,
+        ws_ping_interval=20,
+    )
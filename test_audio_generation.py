@@ -1,5 +1,7 @@
 import os
 import io
+import sys
+import audioop
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
 from pydub import AudioSegment
@@ -27,14 +29,15 @@ TEXT_TO_SPEAK = "Hello, this is a test of the audio generation and conversion pi
 # The name of the final output file
 OUTPUT_FILENAME = "output.ulaw"
 
-# Get available voices
-try:
-    voices = elevenlabs_client.voices.search()
-    print("Available voices:")
-    for voice in voices.voices:
-        print(f"Name: {voice.name}, ID: {voice.voice_id}")
-except Exception as e:
-    print(f"[ERROR] Could not fetch voices: {e}")
+def list_voices():
+    """Fetches and prints the available voices (one HTTPS round-trip)."""
+    try:
+        voices = elevenlabs_client.voices.search()
+        print("Available voices:")
+        for voice in voices.voices:
+            print(f"Name: {voice.name}, ID: {voice.voice_id}")
+    except Exception as e:
+        print(f"[ERROR] Could not fetch voices: {e}")
 
 def test_pipeline():
     """
@@ -59,7 +62,11 @@ def test_pipeline():
     # Step 2: Collect the MP3 audio chunks into a single byte string
     try:
         print("4. Collecting MP3 audio chunks into memory...")
-        mp3_data = b"".join([chunk for chunk in audio_stream])
+        # A single growing bytearray avoids materializing the chunk list
+        # plus a second full-size bytes copy that b"".join would make.
+        mp3_data = bytearray()
+        for chunk in audio_stream:
+            mp3_data.extend(chunk)
         print(f"5. MP3 audio collected. Total size: {len(mp3_data)} bytes.")
         if len(mp3_data) == 0:
             print("[ERROR] MP3 data from ElevenLabs is empty. Aborting.")
@@ -75,13 +82,14 @@ def test_pipeline():
         audio_segment = AudioSegment.from_file(io.BytesIO(mp3_data), format="mp3")
         print("7. pydub loaded MP3 data from memory.")
 
-        # Set the frame rate to 8000Hz (required for Twilio)
-        resampled_audio = audio_segment.set_frame_rate(8000)
+        # Set the frame rate to 8000Hz mono 16-bit (required for Twilio)
+        resampled_audio = audio_segment.set_frame_rate(8000).set_channels(1).set_sample_width(2)
         print("8. pydub resampled audio to 8000Hz.")
-        
-        # Export as mu-law format
-        output_bytes = resampled_audio.export(format="mulaw").read()
-        print(f"9. pydub exported audio to mu-law. Total size: {len(output_bytes)} bytes.")
+
+        # mu-law encode in-process; export(format="mulaw") would fork a
+        # second ffmpeg just for this byte-per-sample transform.
+        output_bytes = audioop.lin2ulaw(resampled_audio.raw_data, 2)
+        print(f"9. Encoded audio to mu-law in-process. Total size: {len(output_bytes)} bytes.")
 
     except Exception as e:
         # This is the most likely point of failure if ffmpeg is not installed
@@ -103,4 +111,8 @@ def test_pipeline():
 
 # Run the main function
 if __name__ == "__main__":
+    # The voice list is only needed when picking a new voice_id, so don't
+    # pay the API round-trip on every test run.
+    if "--list-voices" in sys.argv:
+        list_voices()
     test_pipeline()
\ No newline at end of file
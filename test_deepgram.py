@@ -1,22 +1,58 @@
 import os
-import json
+import sys
+import orjson
+import asyncio
+import aiofiles
 from dotenv import load_dotenv
 from deepgram import (
     DeepgramClient,
     DeepgramClientOptions,
     PrerecordedOptions,
-    BufferSource,
+    StreamSource,
 )
 
 # Load environment variables from .env file
 load_dotenv()
 
-# The path to your audio file
-AUDIO_FILE = "test_audio.wav"
+# The audio files to transcribe; with the async client they are all
+# uploaded and processed concurrently.
+AUDIO_FILES = ["test_audio.wav"]
 
-def main():
+# Immutable across calls, so build it once instead of per file.
+_OPTIONS = PrerecordedOptions(
+    model="nova-2",
+    smart_format=True,
+)
+
+async def _read_chunks(audio_path, chunk_size=65536):
     """
-    Transcribes a local audio file using Deepgram's Pre-recorded API.
+    Yields the audio file in chunks without blocking the event loop.
+    """
+    async with aiofiles.open(audio_path, "rb") as audio_file:
+        while True:
+            chunk = await audio_file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+async def transcribe_one(prerecorded, audio_path):
+    """
+    Transcribes a single local audio file using Deepgram's Pre-recorded API.
+    """
+    # Streaming chunks keeps disk I/O off the event loop and overlaps the
+    # read with the upload, so concurrent transcriptions aren't serialized
+    # behind a blocking file.read().
+    payload: StreamSource = {
+        "stream": _read_chunks(audio_path),
+    }
+
+    print(f"Sending {audio_path} to Deepgram for transcription...")
+    response = await prerecorded.transcribe_file(payload, _OPTIONS)
+    return response.to_dict()
+
+async def main():
+    """
+    Transcribes local audio files concurrently using the async client.
     """
     try:
         # STEP 1: Create a Deepgram client using your API key
@@ -24,29 +60,25 @@ def main():
         config = DeepgramClientOptions(verbose=0) # Change to 1 for detailed logs
         deepgram = DeepgramClient(os.getenv("DEEPGRAM_API_KEY"), config)
 
-        # STEP 2: Read the audio file
-        with open(AUDIO_FILE, "rb") as file:
-            buffer_data = file.read()
-
-        payload: BufferSource = {
-            "buffer": buffer_data,
-        }
-
-        # STEP 3: Configure Deepgram options
-        options = PrerecordedOptions(
-            model="nova-2",
-            smart_format=True,
+        # STEP 2: Transcribe all files in parallel over the shared client;
+        # build the prerecorded sub-client once instead of per file
+        prerecorded = deepgram.listen.asyncprerecorded.v("1")
+        results = await asyncio.gather(
+            *(transcribe_one(prerecorded, path) for path in AUDIO_FILES)
         )
 
-        # STEP 4: Call the API
-        print("Sending audio file to Deepgram for transcription...")
-        response = deepgram.listen.prerecorded.v("1").transcribe_file(payload, options)
-        
-        # STEP 5: Print the results
-        print("\n--- TRANSCRIPTION RESULTS ---")
-        print(json.dumps(response.to_dict(), indent=4))
-        print("---------------------------\n")
-
+        # STEP 3: Print the results. orjson encodes the big nested response
+        # (word-level timestamps and all) natively; write the bytes straight
+        # to stdout rather than round-tripping through a str. Output is
+        # compact -- pipe through jq for human viewing, indenting long
+        # transcripts burns memory and format branches per token.
+        for audio_path, result in zip(AUDIO_FILES, results):
+            print(f"\n--- TRANSCRIPTION RESULTS: {audio_path} ---")
+            sys.stdout.flush()
+            sys.stdout.buffer.write(orjson.dumps(result))
+            sys.stdout.buffer.write(b"\n")
+            sys.stdout.buffer.flush()
+            print("---------------------------\n")
 
     except Exception as e:
         print(f"\n--- AN ERROR OCCURRED ---")
@@ -54,4 +86,4 @@ def main():
         print("---------------------------\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
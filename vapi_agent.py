@@ -1,13 +1,24 @@
 import os
 import httpx
-import json
-from typing import Dict, Any, Optional
-from fastapi import FastAPI, Request, HTTPException
+import orjson
+import random
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+from fastapi import FastAPI, Request, HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ValidationError, field_validator
 from dotenv import load_dotenv
+from cachetools import TTLCache
 
 # --- INITIALIZATION ---
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 load_dotenv()
-app = FastAPI()
+# orjson encodes the results payload natively, several times faster than
+# the default json-based response path.
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Environment variables
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
@@ -15,92 +26,242 @@ VAPI_API_KEY = os.getenv("VAPI_API_KEY")
 
 # Constants
 DEFAULT_CITY = "Singapore"
-WEATHER_API_BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
+WEATHER_API_BASE_URL = "https://api.openweathermap.org/data/2.5"
+WEATHER_API_PATH = "/weather"
+
+# The key and units never change, so they live on the client as default
+# params; per-call requests only add the city.
+_WEATHER_PARAMS_BASE = {
+    "appid": WEATHER_API_KEY,
+    "units": "metric"
+}
+
+# Shared across webhook invocations so tool calls reuse warm keep-alive
+# connections instead of paying a TCP+TLS handshake per request.
+http_client: Optional[httpx.AsyncClient] = None
+
+@app.on_event("startup")
+async def validate_config():
+    # Fail fast: without the keys every request would just degrade into
+    # runtime error strings, so refuse to serve at all.
+    missing = [
+        name for name, value in (
+            ("WEATHER_API_KEY", WEATHER_API_KEY),
+            ("VAPI_API_KEY", VAPI_API_KEY),
+        ) if not value
+    ]
+    if missing:
+        raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
+
+@app.on_event("startup")
+async def create_http_client():
+    global http_client
+    # HTTP/2 multiplexes concurrent tool calls to the same host over one
+    # TCP connection instead of opening a socket per request. base_url and
+    # default params are parsed/merged once here instead of per request.
+    http_client = httpx.AsyncClient(
+        base_url=WEATHER_API_BASE_URL,
+        params=_WEATHER_PARAMS_BASE,
+        http2=True,
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=20,
+            max_connections=100,
+            keepalive_expiry=30,
+        ),
+    )
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+# Weather barely changes minute to minute, so repeat questions within a
+# conversation can skip the API entirely. Errors are never cached.
+_weather_cache: TTLCache = TTLCache(maxsize=256, ttl=90)
+
+# In-flight lookups keyed by normalized city: a second caller for the same
+# city awaits the first caller's future instead of issuing its own request.
+_weather_inflight: Dict[str, asyncio.Future] = {}
+
+# --- WEBHOOK PAYLOAD MODELS ---
+# Validation runs in pydantic-core's compiled parser, replacing the chains
+# of .get() lookups and isinstance checks the endpoint used to do.
+class ToolFunction(BaseModel):
+    name: str = ""
+    arguments: Dict[str, Any] = {}
+
+    @field_validator("arguments", mode="before")
+    @classmethod
+    def parse_arguments(cls, value):
+        # VAPI sometimes sends arguments as a JSON string; normalize it
+        # once here so dispatchers always see a dict.
+        if isinstance(value, str):
+            return orjson.loads(value) if value else {}
+        return value or {}
+
+class ToolCall(BaseModel):
+    id: str
+    type: str = ""
+    function: ToolFunction = ToolFunction()
+
+class Message(BaseModel):
+    type: str = ""
+    toolCalls: List[ToolCall] = []
+
+class WebhookBody(BaseModel):
+    message: Message = Message()
+
+# Cap concurrent upstream requests at the pool's keep-alive size so a burst
+# queues here instead of piling up on sockets, and retry transient failures
+# with jittered exponential backoff. Client errors (4xx) are not retried.
+_WEATHER_SEM = asyncio.Semaphore(20)
+_WEATHER_RETRIES = 3
+
+async def _fetch_weather(params: Dict[str, Any]) -> Dict[str, Any]:
+    delay = 0.1
+    for attempt in range(_WEATHER_RETRIES):
+        try:
+            async with _WEATHER_SEM:
+                response = await http_client.get(WEATHER_API_PATH, params=params)
+                response.raise_for_status()
+                return response.json()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code < 500 or attempt == _WEATHER_RETRIES - 1:
+                raise
+        except httpx.TransportError:
+            if attempt == _WEATHER_RETRIES - 1:
+                raise
+        await asyncio.sleep(delay * (1 + random.random()))
+        delay = min(delay * 2, 1.0)
+
+async def _lookup_weather(city: str, cache_key: str) -> str:
+    params = {"q": city}
 
-# --- TOOL/FUNCTION DEFINITION ---
-async def get_weather(city: str = DEFAULT_CITY) -> str:
-    """Fetches the current weather for a given city."""
-    if not WEATHER_API_KEY:
-        print("[ERROR] WEATHER_API_KEY is not set.")
-        return "I can't fetch the weather right now; my API key is missing."
-
-    params = {
-        "q": city,
-        "appid": WEATHER_API_KEY,
-        "units": "metric"
-    }
-    
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(WEATHER_API_BASE_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            description = data['weather'][0]['description']
-            temp = data['main']['temp']
-            
-            result = f"The current weather in {city} is {temp} degrees Celsius with {description}."
-            print(f"Function result: '{result}'")
-            return result
-            
+        data = await _fetch_weather(params)
+
+        description = data['weather'][0]['description']
+        temp = data['main']['temp']
+
+        result = f"The current weather in {city} is {temp} degrees Celsius with {description}."
+        _weather_cache[cache_key] = result
+        logger.debug("Function result: '%s'", result)
+        return result
+
     except httpx.HTTPStatusError as e:
         error_msg = f"Sorry, I couldn't find the city {city}. Please check the spelling." if e.response.status_code == 404 else "Sorry, I had a problem fetching the weather."
-        print(f"Weather API error: {str(e)}")
+        logger.warning("Weather API error: %s", e)
         return error_msg
-    except Exception as e:
-        print(f"Unexpected error fetching weather: {str(e)}")
+    except Exception:
+        logger.exception("Unexpected error fetching weather")
         return "Sorry, an unexpected error occurred while fetching the weather."
 
+# --- TOOL/FUNCTION DEFINITION ---
+async def get_weather(city: str = DEFAULT_CITY) -> str:
+    """Fetches the current weather for a given city."""
+    cache_key = city.strip().lower()
+    cached = _weather_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Single-flight: when an identical lookup is already in the air, await
+    # its result rather than duplicating the upstream request. shield()
+    # keeps one waiter's cancellation from cancelling the shared future
+    # out from under every other waiter.
+    inflight = _weather_inflight.get(cache_key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _weather_inflight[cache_key] = future
+    try:
+        result = await _lookup_weather(city, cache_key)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    finally:
+        _weather_inflight.pop(cache_key, None)
+    future.set_result(result)
+    return result
+
 # Function registry
 TOOL_FUNCTIONS = {
     "getWeather": get_weather
 }
 
+def _make_caller(function):
+    # Closing over the target function specializes the arg-parse + call
+    # sequence per tool, so the webhook loop does one dict lookup per call.
+    async def caller(tool_call: ToolCall):
+        args = tool_call.function.arguments
+        return await function(**args) if args else await function()
+    return caller
+
+# The registry is fixed at import time, so the dispatchers can be too.
+_DISPATCH = {name: _make_caller(function) for name, function in TOOL_FUNCTIONS.items()}
+
+# Most VAPI traffic is status/transcript events, not tool calls; answer
+# those with one pre-serialized response instead of re-encoding a constant.
+_EMPTY_RESULTS = Response(content=b'{"results":[]}', media_type="application/json")
+
 # --- VAPI WEBHOOK ENDPOINT ---
 @app.post("/")
 async def vapi_webhook(request: Request):
+    # model_validate_json parses the raw bytes straight into the model in
+    # pydantic-core, skipping Starlette's stdlib json.loads and the
+    # intermediate Python dict FastAPI's body parsing would build.
     try:
-        payload = await request.json()
-        message = payload.get("message", {})
-        results = []
+        body = WebhookBody.model_validate_json(await request.body())
+    except ValidationError as e:
+        logger.warning("Invalid webhook payload: %s", e)
+        raise HTTPException(status_code=400, detail="Invalid webhook payload")
 
-        if message.get("type") != "tool-calls" or "toolCalls" not in message:
-            return {"results": results}
+    try:
+        message = body.message
+        results = []
 
-        if not VAPI_API_KEY:
-            raise HTTPException(status_code=500, detail="VAPI_API_KEY not found in environment")
+        if message.type != "tool-calls" or not message.toolCalls:
+            return _EMPTY_RESULTS
 
-        for tool_call in message["toolCalls"]:
-            if tool_call.get("type") != "function":
+        # First pass: validate each call and build its coroutine. Execution
+        # happens concurrently below, so N independent lookups cost one
+        # round-trip instead of the sum of them.
+        pending = []
+        for tool_call in message.toolCalls:
+            if tool_call.type != "function":
                 continue
 
-            function_name = tool_call.get("function", {}).get("name")
-            if function_name not in TOOL_FUNCTIONS:
-                print(f"Warning: Unknown function {function_name}")
+            caller = _DISPATCH.get(tool_call.function.name)
+            if caller is None:
+                logger.warning("Unknown function %s", tool_call.function.name)
                 continue
 
-            try:
-                args = tool_call["function"].get("arguments", {})
-                if isinstance(args, str):
-                    args = json.loads(args)
-                
-                function = TOOL_FUNCTIONS[function_name]
-                result = await function(**args) if args else await function()
+            # Building the coroutine can't fail (the model already
+            # validated the call), so no per-iteration try/except: any
+            # execution error is classified once after the gather.
+            pending.append((tool_call.id, tool_call.function.name, caller(tool_call)))
 
+        # Second pass: run the calls concurrently and map results back.
+        raw_results = await asyncio.gather(
+            *(coro for _, _, coro in pending), return_exceptions=True
+        )
+        # BaseException, not Exception: CancelledError escaping a call
+        # would otherwise be appended under "result" and break encoding.
+        for (tool_call_id, function_name, _), result in zip(pending, raw_results):
+            if isinstance(result, BaseException):
+                logger.error("Error executing %s", function_name, exc_info=result)
                 results.append({
-                    "toolCallId": tool_call["id"],
-                    "result": result
+                    "toolCallId": tool_call_id,
+                    "error": str(result)
                 })
-
-            except Exception as e:
-                print(f"Error executing {function_name}: {str(e)}")
+            else:
                 results.append({
-                    "toolCallId": tool_call["id"],
-                    "error": str(e)
+                    "toolCallId": tool_call_id,
+                    "result": result
                 })
 
         return {"results": results}
 
     except Exception as e:
-        print(f"Webhook error: {str(e)}")
+        logger.exception("Webhook error")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file